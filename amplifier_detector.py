@@ -34,6 +34,7 @@ from .common_utils import (
     argparser_add_verbose,
     check_caps,
     check_non_negative_float,
+    load_proto_classes,
     parse_port,
     scrap_packet,
 )
@@ -180,6 +181,9 @@ def main(args):
     dest_port = parse_port(options.port)
 
     sniffer = ReflectorSniffer(options)
+    # layers of application protocols are registered by importing them, so they
+    # have to be loaded before sniffing for sniffed packets to be dissected
+    load_proto_classes()
 
     # Setup sniff, filtering for IP traffic
     filter_string = "udp and host " + dest_ip
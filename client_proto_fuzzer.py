@@ -51,7 +51,7 @@ def tcp_server(test_params, payloads):
             message = open(payload.payload_file).read()
             (client_sock, addr) = sock.accept()
             test_params.test_stats.packets_received += 1
-            print_verbose(test_params, "Received packet from: {}".format(addr))
+            print_verbose(test_params, "Received packet from: {}", addr)
             client_sock.send(message)
             client_sock.close()
             test_params.test_stats.packets_sent += 1
@@ -91,7 +91,7 @@ def udp_server(test_params, payloads):
             message = open(payload.payload_file).read()
             (_, addr) = sock.recvfrom(INPUT_BUFFER_SIZE)
             test_params.test_stats.packets_received += 1
-            print_verbose(test_params, "Received packet from: {}".format(addr))
+            print_verbose(test_params, "Received packet from: {}", addr)
             sock.sendto(message, addr)
             test_params.test_stats.packets_sent += 1
             if payload.name:
@@ -22,27 +22,23 @@
 #
 
 import argparse
+import array
+import atexit
+import errno
+import os
 import random
+import select
 import socket
 import ssl
 import struct
-import sys
 import time
-from enum import Enum
+from collections import defaultdict
+from enum import Enum, IntEnum
 
 from IPy import IP as IPY_IP
 from scapy.all import DNS as mDNS
-from scapy.all import IP, TCP, UDP, IPv6, Raw, sniff, sr1
-from scapy.layers.http import HTTPRequest, HTTPResponse
-from scapy.contrib.coap import CoAP
-from scapy.contrib.mqtt import MQTT
+from scapy.all import IP, TCP, UDP, IPv6, Raw, conf, raw, sniff
 from scapy.error import Scapy_Exception
-from scapy_ssl_tls.ssl_tls import DTLSRecord as DTLS
-
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
 
 # Default size of input buffer
 INPUT_BUFFER_SIZE = 10000
@@ -50,6 +46,12 @@ INPUT_BUFFER_SIZE = 10000
 # Number of characters in line of separator
 SEPARATOR_LINE_SIZE = 80
 
+# Default line of separator
+SEPARATOR_LINE = SEPARATOR_LINE_SIZE * "="
+
+# Line separating description of single packet from other messages
+PACKET_SEPARATOR_LINE = 60 * "-"
+
 # Time in sec to be delayed to show disclaimer
 SLEEP_TIME_ON_DISCLAIMER = 1
 
@@ -62,23 +64,63 @@ NET_MIN_HIGH_PORT = 49152
 # Maximal number of port for TCP and UDP protocols
 NET_MAX_PORT = 65535
 
+# Maximal number of TCP connections opened at the same time by tcp_sr1_batch()
+# (select() supports up to 1024 descriptors on most platforms)
+TCP_BATCH_SIZE = 500
+
+# Precompiled structures of unsigned integers in network byte order
+UINT16_STRUCT = struct.Struct("!H")
+UINT32_STRUCT = struct.Struct("!I")
+
+# Mapping of IP version to address family used by sockets
+SOCKET_FAMILY = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+# Socket options (level, option, value) set for TCP connections opened by
+# tcp_sr1() and tcp_sr1_batch()
+TCP_SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_REUSEADDR, 1),
+]
+
+
+# Addresses of local node (keyed by IP version) detected by get_local_ip()
+# and get_local_ipv6_address() - local address does not change during test
+LOCAL_IP_CACHE = {}
+
+# Contents of test message files (keyed by path) loaded by load_test_packet()
+# together with modification time of file
+TEST_PACKET_CACHE = {}
+
+# Maximal number of test message files kept in TEST_PACKET_CACHE
+TEST_PACKET_CACHE_SIZE = 256
+
+# Messages already displayed by print_once()
+PRINTED_MESSAGES = set()
+
 
 def get_local_ip():
     """Returns IP address of local node."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.connect(("1.255.255.255", 80))
-    local_ip = sock.getsockname()[0]
-    sock.close()
-    return local_ip
+    if 4 not in LOCAL_IP_CACHE:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect(("1.255.255.255", 80))
+        LOCAL_IP_CACHE[4] = sock.getsockname()[0]
+        sock.close()
+    return LOCAL_IP_CACHE[4]
 
 
 def get_local_ipv6_address():
     """Returns IPv6 address of local node."""
-    sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
-    sock.connect(("::1", 80))
-    local_ip = sock.getsockname()[0]
-    sock.close()
-    return local_ip
+    if 6 not in LOCAL_IP_CACHE:
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        sock.connect(("::1", 80))
+        LOCAL_IP_CACHE[6] = sock.getsockname()[0]
+        sock.close()
+    return LOCAL_IP_CACHE[6]
+
+
+def clear_local_ip_cache():
+    """Forgets detected addresses of local node, so they will be detected again."""
+    LOCAL_IP_CACHE.clear()
 
 
 def get_random_high_port():
@@ -86,41 +128,41 @@ def get_random_high_port():
     return random.randint(NET_MIN_HIGH_PORT, NET_MAX_PORT)
 
 
-def print_verbose(test_params, message):
-    """Prints messages displayed only in the verbose/debug mode."""
+def print_verbose(test_params, message, *args):
+    """Prints messages displayed only in the verbose/debug mode.
+
+        Message is formatted with given arguments only when it is printed.
+    """
     if test_params.verbose:
+        print (message.format(*args) if args else message)
+
+
+def print_once(message):
+    """Prints message only if it was not printed before (e.g. for repeated warnings)."""
+    if message not in PRINTED_MESSAGES:
+        PRINTED_MESSAGES.add(message)
         print (message)
 
 
 def show_verbose(test_params, packet, protocol=None):
-    """Parses response packet and scraps response from stdout."""
-    if protocol:
+    """Parses response packet and returns its text description (only in verbose mode)."""
+    if not test_params.verbose:
+        return ""
+    if protocol is not None:
         try:
             proto_handler = proto_mapping_request(protocol)
             packet = proto_handler(packet)
         except KeyError:
             return "Response is not parsable!"
-    parsed_response = ""
-    if test_params.verbose:
-        capture = StringIO()
-        save_stdout, sys.stdout = sys.stdout, capture
-        packet.show()
-        sys.stdout = save_stdout
-        parsed_response = capture.getvalue()
-    return parsed_response
+    return packet.show(dump=True)
 
 
 def scrap_packet(packet):
-    """Parses response packet and scraps response from stdout."""
-    capture = StringIO()
-    save_stdout, sys.stdout = sys.stdout, capture
-    packet.show()
-    sys.stdout = save_stdout
-    parsed_response = capture.getvalue()
-    return parsed_response
+    """Parses response packet and returns its text description."""
+    return packet.show(dump=True)
 
 
-class Protocol(Enum):
+class Protocol(IntEnum):
     """Enumeration of protocols supported by Cotopaxi"""
 
     ALL = 0
@@ -134,26 +176,64 @@ class Protocol(Enum):
     HTCPCP = 8
     RTSP = 9
 
+    # members are printed like plain Enum members (e.g. "Protocol.CoAP"),
+    # not like their int values
+    __str__ = Enum.__str__
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+
+# Default ports of supported protocols
+DEFAULT_PORTS = {
+    Protocol.ALL: 0,
+    Protocol.UDP: 0,
+    Protocol.TCP: 0,
+    Protocol.CoAP: 5683,
+    Protocol.mDNS: 5353,
+    Protocol.MQTT: 1883,
+    Protocol.DTLS: 4433,
+    Protocol.SSDP: 1900,
+    Protocol.RTSP: 554,
+    Protocol.HTCPCP: 554,
+}
+
+# Scapy classes used to parse requests and responses of supported protocols
+# (filled by load_proto_classes() on first use)
+PROTO_REQUEST_CLASSES = {}
+PROTO_RESPONSE_CLASSES = {}
+
+# Bitmasks of protocols enabled by protocol masks (bit number is protocol value),
+# masks not listed here enable only protocol equal to mask
+PROTO_MASK_BITS = {
+    Protocol.ALL: (1 << len(Protocol)) - 1,
+    Protocol.TCP: (1 << Protocol.TCP)
+    | (1 << Protocol.MQTT)
+    | (1 << Protocol.HTCPCP)
+    | (1 << Protocol.RTSP),
+    Protocol.UDP: (1 << Protocol.UDP)
+    | (1 << Protocol.CoAP)
+    | (1 << Protocol.DTLS)
+    | (1 << Protocol.mDNS)
+    | (1 << Protocol.SSDP),
+}
+
 
 def default_port(protocol):
     """Returns default port for given protocol."""
-    return {
-        Protocol.ALL: 0,
-        Protocol.UDP: 0,
-        Protocol.TCP: 0,
-        Protocol.CoAP: 5683,
-        Protocol.mDNS: 5353,
-        Protocol.MQTT: 1883,
-        Protocol.DTLS: 4433,
-        Protocol.SSDP: 1900,
-        Protocol.RTSP: 554,
-        Protocol.HTCPCP: 554,
-    }[protocol]
+    return DEFAULT_PORTS[protocol]
 
 
-def proto_mapping_request(protocol):
-    """Provides mapping of enum values to implementation classes."""
-    return {
+def load_proto_classes():
+    """Imports scapy layers of supported protocols and fills mappings of protocol classes."""
+    # layers of application protocols (especially scapy-ssl_tls used for DTLS)
+    # are imported only when needed, because importing them takes a lot of time
+    from scapy.contrib.coap import CoAP
+    from scapy.contrib.mqtt import MQTT
+    from scapy.layers.http import HTTPRequest, HTTPResponse
+    from scapy_ssl_tls.ssl_tls import DTLSRecord as DTLS
+
+    common_classes = {
         Protocol.ALL: IP,
         Protocol.UDP: UDP,
         Protocol.TCP: TCP,
@@ -161,48 +241,31 @@ def proto_mapping_request(protocol):
         Protocol.mDNS: mDNS,
         Protocol.MQTT: MQTT,
         Protocol.DTLS: DTLS,
-        Protocol.RTSP: HTTPRequest,
-        Protocol.SSDP: HTTPRequest,
-        Protocol.HTCPCP: HTTPRequest,
-    }[protocol]
+    }
+    PROTO_REQUEST_CLASSES.update(common_classes)
+    PROTO_RESPONSE_CLASSES.update(common_classes)
+    for protocol in (Protocol.RTSP, Protocol.SSDP, Protocol.HTCPCP):
+        PROTO_REQUEST_CLASSES[protocol] = HTTPRequest
+        PROTO_RESPONSE_CLASSES[protocol] = HTTPResponse
+
+
+def proto_mapping_request(protocol):
+    """Provides mapping of enum values to implementation classes."""
+    if not PROTO_REQUEST_CLASSES:
+        load_proto_classes()
+    return PROTO_REQUEST_CLASSES[protocol]
 
 
 def proto_mapping_response(protocol):
     """Provides mapping of enum values to implementation classes."""
-    return {
-        Protocol.ALL: IP,
-        Protocol.UDP: UDP,
-        Protocol.TCP: TCP,
-        Protocol.CoAP: CoAP,
-        Protocol.mDNS: mDNS,
-        Protocol.MQTT: MQTT,
-        Protocol.DTLS: DTLS,
-        Protocol.RTSP: HTTPResponse,
-        Protocol.SSDP: HTTPResponse,
-        Protocol.HTCPCP: HTTPResponse,
-    }[protocol]
+    if not PROTO_RESPONSE_CLASSES:
+        load_proto_classes()
+    return PROTO_RESPONSE_CLASSES[protocol]
 
 
 def protocol_enabled(protocol, proto_mask):
     """Core tester data and methods"""
-    if proto_mask == Protocol.ALL:
-        return True
-    if proto_mask == protocol:
-        return True
-    if proto_mask == Protocol.TCP and protocol in [
-        Protocol.MQTT,
-        Protocol.HTCPCP,
-        Protocol.RTSP,
-    ]:
-        return True
-    if proto_mask == Protocol.UDP and protocol in [
-        Protocol.CoAP,
-        Protocol.DTLS,
-        Protocol.mDNS,
-        Protocol.SSDP,
-    ]:
-        return True
-    return False
+    return bool(PROTO_MASK_BITS.get(proto_mask, 1 << proto_mask) & (1 << protocol))
 
 
 def argparser_add_verbose(parser):
@@ -332,7 +395,10 @@ def create_client_tester_argparser():
 
 def print_separator(used_char="="):
     """Print line separator using provided char"""
-    print (SEPARATOR_LINE_SIZE * used_char)
+    if used_char == "=":
+        print (SEPARATOR_LINE)
+    else:
+        print (SEPARATOR_LINE_SIZE * used_char)
 
 
 def print_disclaimer():
@@ -352,7 +418,12 @@ before running this tool!"""
 def check_caps():
     """Function check privileges required to run scapy sniffing functions."""
     try:
-        sniff(count=1, timeout=1)
+        if hasattr(socket, "AF_PACKET"):
+            # opening raw packet socket requires the same privileges as sniffing
+            # (and unlike sniff() it does not wait for any packet)
+            socket.socket(socket.AF_PACKET, socket.SOCK_RAW).close()
+        else:
+            sniff(count=1, timeout=1)
     except socket.error:
         exit(
             "\nThis tool requires admin permissions on network interfaces.\n"
@@ -378,30 +449,46 @@ class TestStatistics(object):
     def __init__(self):
         self.packets_sent = 0
         self.packets_received = 0
-        self.packets_rtt = []
+        self.packets_rtt = array.array("i")
+        self.rtt_min = 0
+        self.rtt_max = 0
+        self.rtt_sum = 0
         self.test_start = time.time()
-        self.active_endpoints = {}
-        self.potential_endpoints = {}
-        self.inactive_endpoints = {}
-        for proto in Protocol:
-            self.active_endpoints[proto] = []
-            self.potential_endpoints[proto] = []
-            self.inactive_endpoints[proto] = []
+        self.active_endpoints = defaultdict(list)
+        self.potential_endpoints = defaultdict(list)
+        self.inactive_endpoints = defaultdict(list)
 
     def test_time(self):
         """Calculates test time in seconds"""
         return time.time() - self.test_start
 
+    def add_rtt(self, rtt):
+        """Stores Round-Trip Time (in ms) of received packet and updates min/max/sum."""
+        if not self.packets_rtt or rtt < self.rtt_min:
+            self.rtt_min = rtt
+        if not self.packets_rtt or rtt > self.rtt_max:
+            self.rtt_max = rtt
+        self.rtt_sum += rtt
+        self.packets_rtt.append(rtt)
+
+    def rtt_summary(self):
+        """Returns (min, avg, max) of Round-Trip Times in ms or None if no RTT was stored."""
+        if not self.packets_rtt:
+            return None
+        return self.rtt_min, self.rtt_sum / len(self.packets_rtt), self.rtt_max
+
 
 class Endpoint(object):
     """Object representing test endpoint (source or destination)"""
 
-    def __init__(self, ip_addr=None, port=None, ipv6_addr=None):
-        if ip_addr is None:
+    def __init__(self, ip_addr=None, port=None, ipv6_addr=None, auto_detect=True):
+        # addresses not provided are set to addresses of local node, unless
+        # auto_detect is False (endpoint addresses will be set by caller)
+        if ip_addr is None and auto_detect:
             self.ip_addr = get_local_ip()
         else:
             self.ip_addr = ip_addr
-        if ipv6_addr is None:
+        if ipv6_addr is None and auto_detect:
             self.ipv6_addr = get_local_ipv6_address()
         else:
             self.ipv6_addr = ipv6_addr
@@ -445,7 +532,7 @@ class TestParams(object):
     def __init__(self, name=""):
         self.test_name = name
         self.src_endpoint = Endpoint()
-        self.dst_endpoint = Endpoint()
+        self.dst_endpoint = Endpoint(auto_detect=False)
         self.parsed_options = {}
         self.protocol = Protocol.ALL
         self.timeout_sec = 1
@@ -461,8 +548,9 @@ class TestParams(object):
 
     def print_stats(self):
         """Prints statistics gathered during tests"""
-        print (80 * "=" + "\nTest statistics:")
-        print (
+        # report is gathered in list of lines and printed at once
+        report = [SEPARATOR_LINE, "Test statistics:"]
+        report.append(
             "Messages sent: {}, responses received: {}, "
             "{:.0f}% message loss, test time: {:.0f} ms".format(
                 self.test_stats.packets_sent,
@@ -473,27 +561,24 @@ class TestParams(object):
                 1000 * self.test_stats.test_time(),
             )
         )
-        if self.test_stats.packets_rtt:
-            print (
-                "Round-Trip Time (min/avg/max): {} / {} / {} ms".format(
-                    min(self.test_stats.packets_rtt),
-                    sum(self.test_stats.packets_rtt) / len(self.test_stats.packets_rtt),
-                    max(self.test_stats.packets_rtt),
-                )
+        rtt_summary = self.test_stats.rtt_summary()
+        if rtt_summary:
+            report.append(
+                "Round-Trip Time (min/avg/max): {} / {} / {} ms".format(*rtt_summary)
             )
         if not self.positive_result_name:
+            print ("\n".join(report))
             return
-        print (80 * "=" + "\nTest results:")
+        report += [SEPARATOR_LINE, "Test results:"]
         active_endpoints = set()
         potential_endpoints = set()
         inactive_endpoints = set()
-        print ("{}:".format(self.positive_result_name))
-        for proto in self.test_stats.active_endpoints:
-            proto_results = self.test_stats.active_endpoints[proto]
+        report.append("{}:".format(self.positive_result_name))
+        for proto, proto_results in self.test_stats.active_endpoints.items():
             if proto_results:
-                print ("    For {}: {}".format(proto, proto_results))
+                report.append("    For {}: {}".format(proto, proto_results))
                 active_endpoints.update(set(proto_results))
-        print (
+        report.append(
             "Total number of {}: {}".format(
                 self.positive_result_name.lower(), len(active_endpoints)
             )
@@ -502,7 +587,7 @@ class TestParams(object):
             for proto, inactive_endpoint in self.test_stats.inactive_endpoints.items():
                 inactive_endpoints.update(set(inactive_endpoint))
             if potential_endpoints:
-                print (
+                report.append(
                     "{}: {}".format(
                         self.potential_result_name, len(potential_endpoints)
                     )
@@ -515,16 +600,19 @@ class TestParams(object):
                     )
                 potential_endpoints.update(set(proto_results))
             if potential_results:
-                print (self.potential_result_name + ":\n")
-                print ("\n".join(potential_results))
+                report.append(self.potential_result_name + ":\n")
+                report += potential_results
         if self.negative_result_name:
             inactive_endpoints.difference_update(active_endpoints)
             inactive_endpoints.difference_update(potential_endpoints)
-            print ("{}: {}".format(self.negative_result_name, len(inactive_endpoints)))
+            report.append(
+                "{}: {}".format(self.negative_result_name, len(inactive_endpoints))
+            )
+        print ("\n".join(report))
 
     def print_client_stats(self):
         """Prints statistics gathered during tests of clients"""
-        print (80 * "=" + "\nTest statistics:")
+        print (SEPARATOR_LINE + "\nTest statistics:")
         print (
             "Requests received: {}, payloads sent: {}, "
             "test time: {:.0f} ms".format(
@@ -547,7 +635,7 @@ class TestParams(object):
         """
         response_time = time.time()
         self.test_stats.packets_received += 1
-        self.test_stats.packets_rtt.append(int(1000 * (response_time - sent_time)))
+        self.test_stats.add_rtt(int(1000 * (response_time - sent_time)))
 
     @property
     def src(self):
@@ -561,9 +649,8 @@ class TestParams(object):
 
     def set_ip_version(self):
         """Function identifies IP version of the protocol"""
-        ip_addr = IPY_IP(self.dst_endpoint.ip_addr)
-        if ip_addr.version() == 6:
-            self.ip_version = 6
+        # only IPv6 addresses contain colons (validated earlier by prepare_ips)
+        self.ip_version = 6 if ":" in self.dst_endpoint.ip_addr else 4
 
 
 def add_highlevel_proto(parser):
@@ -707,10 +794,10 @@ class CotopaxiTester(object):
         print ("[.] Started {}".format(test_name))
         try:
             for dest_ip in self.list_ips:
+                self.test_params.dst_endpoint.ip_addr = dest_ip
+                self.test_params.set_ip_version()
                 for dest_port in self.list_ports:
-                    self.test_params.dst_endpoint.ip_addr = dest_ip
                     self.test_params.dst_endpoint.port = dest_port
-                    self.test_params.set_ip_version()
                     if test_cases:
                         test_function(self.test_params, test_cases)
                     else:
@@ -723,6 +810,7 @@ class CotopaxiTester(object):
         except KeyboardInterrupt:
             print ("\nExiting...")
         finally:
+            close_l3_sockets()
             self.test_params.print_stats()
 
 
@@ -765,16 +853,21 @@ def prepare_ips(ips_input):
             list: Sorted list of unique IP addresses
                 e.g.: ['1.1.1.1', '2.2.2.2', '2.2.2.3'] for the above example.
     """
+    test_ips = set()
     try:
-        test_ips = [
-            ip_addr
-            for address_desc in ips_input.split(",")
-            for ip_addr in IPY_IP(address_desc, make_net=1)
-        ]
+        for address_desc in ips_input.split(","):
+            network = IPY_IP(address_desc, make_net=1)
+            if network.version() == 4:
+                first_ip = network.int()
+                test_ips.update(
+                    socket.inet_ntoa(UINT32_STRUCT.pack(ip_int))
+                    for ip_int in range(first_ip, first_ip + network.len())
+                )
+            else:
+                test_ips.update(str(ip_addr) for ip_addr in network)
     except ValueError as value_error:
         exit("Cannot parse IP address: {}".format(value_error))
-    test_ips = sorted(set(map(str, test_ips)))
-    return test_ips
+    return sorted(test_ips)
 
 
 def parse_port(port_desc):
@@ -788,6 +881,34 @@ def parse_port(port_desc):
     return None
 
 
+def prepare_port_ranges(port_input):
+    """Parses multiple ports description taken from command line into sorted list of port ranges.
+
+        Args:
+            port_input (str): Ports description in format: '101,103-105,104,242'.
+
+        Returns:
+            list: Sorted list of non-overlapping (first, last) port ranges
+                e.g.: [(101, 101), (103, 105), (242, 242)] for the above example.
+
+    """
+    port_ranges = []
+    for part in port_input.split(","):
+        bounds = [int(bound) for bound in part.split("-", 1)]
+        if bounds[0] <= bounds[-1]:
+            port_ranges.append((bounds[0], bounds[-1]))
+    port_ranges.sort()
+
+    merged_ranges = []
+    for first, last in port_ranges:
+        if merged_ranges and first <= merged_ranges[-1][1] + 1:
+            if last > merged_ranges[-1][1]:
+                merged_ranges[-1] = (merged_ranges[-1][0], last)
+        else:
+            merged_ranges.append((first, last))
+    return merged_ranges
+
+
 def prepare_ports(port_input):
     """Parses multiple ports description taken from command line into sorted list of unique ports.
 
@@ -795,43 +916,41 @@ def prepare_ports(port_input):
             port_input (str): Ports description in format: '101,103-105,104,242'.
 
         Returns:
-            list: Sorted list of unique IP addresses
+            list: Sorted list of unique ports
                 e.g.: [101, 103, 104, 105, 242] for the above example.
 
     """
 
     try:
-        ports = set()
-        parts = port_input.split(",")
-
-        for part in parts:
-            ip_range = map(int, part.split("-", 1))
-            ip_range = set(range(ip_range[0], ip_range[-1] + 1))
-            ports |= set(ip_range)
-
-        ports = sorted(ports)
-        return ports
+        port_ranges = prepare_port_ranges(port_input)
     except ValueError as error:
         exit("Cannot parse port: {}".format(error))
+    return [port for first, last in port_ranges for port in range(first, last + 1)]
+
 
+def tcp_sr1(test_params, test_packet, socket_options=None):
+    """Sends test message to server using TCP protocol and parses response.
 
-def tcp_sr1(test_params, test_packet):
-    """Sends test message to server using TCP protocol and parses response."""
+        Args:
+            test_params (TestParams): Test parameters.
+            test_packet (str): Test message.
+            socket_options (list): Additional socket options given as
+                (level, option, value) tuples, set after TCP_SOCKET_OPTIONS.
+    """
     in_data = None
     connect_handler = None
     sent_time = test_params.report_sent_packet()
 
-    sock_ip = {4: socket.AF_INET, 6: socket.AF_INET6}
-    connect_args = {
-        4: (test_params.dst_endpoint.ip_addr, test_params.dst_endpoint.port),
-        6: (test_params.dst_endpoint.ip_addr, test_params.dst_endpoint.port, 0, 0),
-    }
     try:
         connect_handler = socket.socket(
-            sock_ip[test_params.ip_version], socket.SOCK_STREAM
+            SOCKET_FAMILY[test_params.ip_version], socket.SOCK_STREAM
         )
+        for socket_option in TCP_SOCKET_OPTIONS + (socket_options or []):
+            connect_handler.setsockopt(*socket_option)
         connect_handler.settimeout(test_params.timeout_sec)
-        connect_handler.connect(connect_args[test_params.ip_version])
+        connect_handler.connect(
+            (test_params.dst_endpoint.ip_addr, test_params.dst_endpoint.port)
+        )
         connect_handler.send(str(test_packet))
 
         in_data = connect_handler.recv(INPUT_BUFFER_SIZE)
@@ -847,32 +966,269 @@ def tcp_sr1(test_params, test_packet):
     return in_data
 
 
-def udp_sr1(test_params, udp_test, dtls_wrap=False):
-    """Sends UDP test message to server using UDP protocol and parses response."""
+def tcp_sr1_parallel(test_params, test_packet, dst_ports):
+    """Sends test message to given ports of server using parallel TCP connections.
+
+        Errors of single connection (e.g. refused or reset) do not stop
+        communication with other ports.
+    """
+    responses = {}
+    out_data = str(test_packet)
+    connecting = {}
+    receiving = {}
+    opened_sockets = []
+    try:
+        for dst_port in dst_ports:
+            sock = socket.socket(
+                SOCKET_FAMILY[test_params.ip_version], socket.SOCK_STREAM
+            )
+            opened_sockets.append(sock)
+            for socket_option in TCP_SOCKET_OPTIONS:
+                sock.setsockopt(*socket_option)
+            sock.setblocking(False)
+            sent_time = test_params.report_sent_packet()
+            connect_error = sock.connect_ex(
+                (test_params.dst_endpoint.ip_addr, dst_port)
+            )
+            if connect_error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                connecting[sock] = (dst_port, sent_time)
+            else:
+                print_verbose(
+                    test_params,
+                    "TCP exception on port {}: {}",
+                    dst_port,
+                    socket.error(connect_error, os.strerror(connect_error)),
+                )
+        deadline = time.time() + test_params.timeout_sec
+        while connecting or receiving:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            readable, writable, _ = select.select(
+                list(receiving), list(connecting), [], remaining
+            )
+            if not readable and not writable:
+                break
+            for sock in writable:
+                endpoint = connecting.pop(sock)
+                try:
+                    connect_error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if connect_error:
+                        raise socket.error(connect_error, os.strerror(connect_error))
+                    sock.send(out_data)
+                except socket.error as exc:
+                    print_verbose(
+                        test_params, "TCP exception on port {}: {}", endpoint[0], exc
+                    )
+                    continue
+                receiving[sock] = endpoint
+            for sock in readable:
+                dst_port, sent_time = receiving.pop(sock)
+                try:
+                    in_data = sock.recv(INPUT_BUFFER_SIZE)
+                except socket.error as exc:
+                    print_verbose(
+                        test_params, "TCP exception on port {}: {}", dst_port, exc
+                    )
+                    continue
+                if in_data:
+                    responses[dst_port] = in_data
+                    test_params.report_received_packet(sent_time)
+    except socket.error as exc:
+        print_verbose(test_params, "TCP exception: {}", exc)
+    finally:
+        for sock in opened_sockets:
+            sock.close()
+    return responses
+
+
+def tcp_sr1_batch(test_params, test_packet, dst_ports):
+    """Sends test message to multiple ports of server using TCP protocol and gathers responses.
+
+        Connections are opened in parallel (up to TCP_BATCH_SIZE at once), so
+        round-trip times of TCP handshakes with different ports overlap.
+
+        Args:
+            test_params (TestParams): Test parameters (destination IP, timeout, IP version).
+            test_packet (str): Test message.
+            dst_ports (list): List of destination ports.
+
+        Returns:
+            dict: Responses keyed by port of responding endpoints.
+    """
+    responses = {}
+    dst_ports = list(dst_ports)
+    for batch_start in range(0, len(dst_ports), TCP_BATCH_SIZE):
+        responses.update(
+            tcp_sr1_parallel(
+                test_params,
+                test_packet,
+                dst_ports[batch_start : batch_start + TCP_BATCH_SIZE],
+            )
+        )
+    return responses
+
+
+def source_is_local(test_params):
+    """Checks whether source address of test is address of local node (no spoofing)."""
+    if test_params.ip_version == 6:
+        return test_params.src_endpoint.ipv6_addr == get_local_ipv6_address()
+    return test_params.src_endpoint.ip_addr == get_local_ip()
+
+
+# Scapy layer 3 sockets (keyed by IP version) used to send packets with spoofed
+# source address - opened on first use and reused for all following packets
+L3_SOCKETS = {}
+
+
+def flush_l3_socket(l3_socket):
+    """Discards packets queued in scapy layer 3 socket since its last use.
+
+        Socket receives all traffic seen by host, so without flushing scapy sr1()
+        would dissect all packets received between tests before the answer.
+    """
+    # only native (PF_PACKET) sockets can be drained this way
+    if isinstance(l3_socket.ins, socket.socket):
+        while select.select([l3_socket.ins], [], [], 0)[0]:
+            l3_socket.ins.recv(INPUT_BUFFER_SIZE)
+
+
+def get_l3_socket(ip_version):
+    """Returns scapy layer 3 socket for given IP version (ready to send next packet)."""
+    if ip_version not in L3_SOCKETS:
+        if ip_version == 6:
+            L3_SOCKETS[ip_version] = conf.L3socket6()
+        else:
+            L3_SOCKETS[ip_version] = conf.L3socket()
+    else:
+        flush_l3_socket(L3_SOCKETS[ip_version])
+    return L3_SOCKETS[ip_version]
+
+
+def close_l3_sockets():
+    """Closes scapy layer 3 sockets opened by get_l3_socket()."""
+    for l3_socket in L3_SOCKETS.values():
+        l3_socket.close()
+    L3_SOCKETS.clear()
+
+
+# sockets are closed at exit also for tools not using perform_testing()
+atexit.register(close_l3_sockets)
+
+
+def udp_sr1_socket(test_params, udp_test):
+    """Sends UDP test message to server using datagram socket and receives response.
+
+        Used instead of scapy sr1() if source address is not spoofed - kernel
+        builds IP and UDP headers, so there is no need to craft whole packet.
+
+        Returns:
+            tuple: Payload of response, address of server and local address
+                of socket (addresses as (ip, port) tuples) or None if no response
+                was received.
+    """
+    response = None
+    if test_params.ip_version == 6:
+        src_ip = test_params.src_endpoint.ipv6_addr
+    else:
+        src_ip = test_params.src_endpoint.ip_addr
+    sock = socket.socket(SOCKET_FAMILY[test_params.ip_version], socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((src_ip, test_params.src_endpoint.port))
+        sock.settimeout(test_params.timeout_sec)
+        sock.connect((test_params.dst_endpoint.ip_addr, test_params.dst_endpoint.port))
+        for _ in range(test_params.nr_retries + 1):
+            sock.send(udp_test)
+            try:
+                in_data, server_addr = sock.recvfrom(INPUT_BUFFER_SIZE)
+            except socket.timeout:
+                continue
+            response = (in_data, server_addr[:2], sock.getsockname()[:2])
+            break
+    except socket.error as exc:
+        if exc.errno == errno.ECONNREFUSED:
+            # ICMP destination unreachable is reported to connected socket
+            # as refused connection
+            print_verbose(test_params, "Received ICMP dest-unreachable")
+        else:
+            print_verbose(test_params, "UDP exception: {}", exc)
+    finally:
+        sock.close()
+    return response
+
+
+def udp_request_packet(test_params, udp_test):
+    """Builds IP/UDP/Raw packet with UDP test message (used for spoofed source address)."""
+    if test_params.ip_version == 6:
+        return (
+            IPv6(
+                src=test_params.src_endpoint.ipv6_addr,
+                dst=test_params.dst_endpoint.ip_addr,
+            )
+            / UDP(
+                sport=test_params.src_endpoint.port, dport=test_params.dst_endpoint.port
+            )
+            / Raw(udp_test)
+        )
+    # UDP checksum is optional for IPv4 - zero value means that it was not computed
+    return (
+        IP(src=test_params.src_endpoint.ip_addr, dst=test_params.dst_endpoint.ip_addr)
+        / UDP(
+            sport=test_params.src_endpoint.port,
+            dport=test_params.dst_endpoint.port,
+            chksum=0,
+        )
+        / Raw(udp_test)
+    )
+
+
+def udp_response_packet(in_data, server_addr, local_addr):
+    """Wraps payload received using datagram socket into IP/UDP/Raw packet.
+
+        Only payload, addresses and ports are the received ones - other fields
+        of IP and UDP headers are not available for datagram socket.
+
+        Args:
+            in_data (bytes): Payload of response.
+            server_addr (tuple): Address of server as (ip, port).
+            local_addr (tuple): Local address of socket as (ip, port).
+
+        Returns:
+            Packet: Scapy packet with response.
+    """
+    ip_class = IPv6 if ":" in server_addr[0] else IP
+    return (
+        ip_class(src=server_addr[0], dst=local_addr[0])
+        / UDP(sport=server_addr[1], dport=local_addr[1])
+        / Raw(in_data)
+    )
+
+
+def udp_sr1(test_params, udp_test, dtls_wrap=False, parse=True):
+    """Sends UDP test message to server using UDP protocol and parses response.
+
+        If parse is False, payload of response is returned as bytes instead of
+        scapy packet (for callers not inspecting IP/UDP layers of response).
+    """
     response = None
     sent_time = test_params.report_sent_packet()
     if not dtls_wrap:
-        if test_params.ip_version == 4:
-            udp_test_packet = IP() / UDP() / Raw(udp_test)
-            udp_test_packet[IP].src = test_params.src_endpoint.ip_addr
-            udp_test_packet[IP].dst = test_params.dst_endpoint.ip_addr
-        elif test_params.ip_version == 6:
-            udp_test_packet = IPv6() / UDP() / Raw(udp_test)
-            udp_test_packet[IPv6].src = test_params.src_endpoint.ipv6_addr
-            udp_test_packet[IPv6].dst = test_params.dst_endpoint.ip_addr
-        udp_test_packet[UDP].sport = test_params.src_endpoint.port
-        udp_test_packet[UDP].dport = test_params.dst_endpoint.port
-        del udp_test_packet[UDP].chksum
-        # if test_params.verbose:
-        #     udp_test_packet.show()
         if test_params.timeout_sec == 0:
             test_params.timeout_sec = 0.0001
-        response = sr1(
-            udp_test_packet,
-            verbose=test_params.verbose,
-            timeout=test_params.timeout_sec,
-            retry=test_params.nr_retries,
-        )
+        if source_is_local(test_params):
+            response = udp_sr1_socket(test_params, udp_test)
+            if response is not None:
+                response = udp_response_packet(*response) if parse else response[0]
+        else:
+            response = get_l3_socket(test_params.ip_version).sr1(
+                udp_request_packet(test_params, udp_test),
+                verbose=test_params.verbose,
+                timeout=test_params.timeout_sec,
+                retry=test_params.nr_retries,
+            )
+            if response is not None and not parse:
+                response = raw(response[UDP].payload) if UDP in response else None
         if response:
             print ("Number of packets received = {}".format(len(response)))
             test_params.report_received_packet(sent_time)
@@ -892,70 +1248,206 @@ def udp_sr1(test_params, udp_test, dtls_wrap=False):
     return response
 
 
+def udp_sr_batch(test_params, udp_test, dst_list):
+    """Sends UDP test message to multiple endpoints and gathers responses.
+
+        All messages are sent from the single socket and responses are awaited
+        together, so the whole batch takes at most one timeout.
+
+        Args:
+            test_params (TestParams): Test parameters (source port, timeout, IP version).
+            udp_test (bytes): Payload of test message.
+            dst_list (list): List of destination endpoints given as (ip, port) tuples.
+
+        Returns:
+            dict: Payloads of responses keyed by (ip, port) of responding endpoints.
+    """
+    responses = {}
+    sent_times = {}
+    if test_params.ip_version == 6:
+        src_ip = test_params.src_endpoint.ipv6_addr
+    else:
+        src_ip = test_params.src_endpoint.ip_addr
+    sock = socket.socket(SOCKET_FAMILY[test_params.ip_version], socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((src_ip, test_params.src_endpoint.port))
+        for dst_addr in dst_list:
+            dst_addr = tuple(dst_addr)
+            try:
+                sock.sendto(udp_test, dst_addr)
+            except socket.error as exc:
+                # endpoint that cannot be reached is skipped, other ones are tested
+                print_verbose(test_params, "UDP exception for {}: {}", dst_addr, exc)
+                continue
+            sent_times[dst_addr] = test_params.report_sent_packet()
+        deadline = time.time() + test_params.timeout_sec
+        while len(responses) < len(sent_times):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([sock], [], [], remaining)
+            if not readable:
+                break
+            in_data, addr = sock.recvfrom(INPUT_BUFFER_SIZE)
+            addr = addr[:2]
+            if addr in sent_times and addr not in responses:
+                responses[addr] = in_data
+                test_params.report_received_packet(sent_times[addr])
+    except socket.error as exc:
+        print_verbose(test_params, "UDP exception: {}", exc)
+    finally:
+        sock.close()
+    return responses
+
+
+def load_test_packet(test_filename):
+    """Returns content of file with test message.
+
+        Content is cached, so the same file used in many tests is read only once
+        (unless it was modified in the meantime).
+
+        Args:
+            test_filename (str): Path to file with test message.
+
+        Returns:
+            str: Content of file.
+    """
+    mtime = os.stat(test_filename).st_mtime
+    cached = TEST_PACKET_CACHE.get(test_filename)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(test_filename, "r") as file_handle:
+        test_packet = file_handle.read()
+    if len(TEST_PACKET_CACHE) >= TEST_PACKET_CACHE_SIZE:
+        TEST_PACKET_CACHE.clear()
+    TEST_PACKET_CACHE[test_filename] = (mtime, test_packet)
+    return test_packet
+
+
 def udp_sr1_file(test_params, test_filename):
     """Reads UDP test message from given file, sends this message to server and parses response"""
-    with open(test_filename, "r") as file_handle:
-        test_data = file_handle.read()
-    return udp_sr1(test_params, test_data)
+    return udp_sr1(test_params, load_test_packet(test_filename))
 
 
 def ssdp_send_query(test_params, query):
     """Sends SSDP query to normal and multicast address."""
+    if test_params.ip_version == 6:
+        print_once("IPv6 is not supported for SSDP")
+        return None
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-    if test_params.ip_version == 4:
+    try:
         sock.sendto(str(query), (SSDP_MULTICAST_IPV4, test_params.dst_endpoint.port))
         sent_time = test_params.report_sent_packet()
-        sock.settimeout(test_params.timeout_sec)
-        try:
+        sock.setblocking(False)
+        # port is compared first, because it differs for most of responses
+        # from other hosts and comparing integers is cheaper than strings
+        target_ip = test_params.dst_endpoint.ip_addr
+        target_port = test_params.dst_endpoint.port
+        deadline = time.time() + test_params.timeout_sec
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([sock], [], [], remaining)
+            if not readable:
+                break
+            # drain all responses queued so far before waiting again
             while True:
-                data, addr = sock.recvfrom(INPUT_BUFFER_SIZE)
+                try:
+                    data, addr = sock.recvfrom(INPUT_BUFFER_SIZE)
+                except socket.error as exc:
+                    if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        break
+                    raise
                 print_verbose(
                     test_params,
-                    "Received response from {} - content:\n{}\n-----".format(
-                        addr, data
-                    ),
+                    "Received response from {} - content:\n{}\n-----",
+                    addr,
+                    data,
                 )
-                if (
-                    test_params.dst_endpoint.ip_addr,
-                    test_params.dst_endpoint.port,
-                ) == addr:
+                if addr[1] == target_port and addr[0] == target_ip:
                     print_verbose(
                         test_params, "This is the response that we was waiting for!"
                     )
                     test_params.report_received_packet(sent_time)
                     return data
-                else:
-                    print_verbose(
-                        test_params, "Received response from another host (not target)!"
-                    )
-        except socket.timeout:
-            print_verbose(test_params, "Received no response!")
-
-    elif test_params.ip_version == 6:
-        print ("IPv6 is not supported for SSDP")
+                print_verbose(
+                    test_params, "Received response from another host (not target)!"
+                )
+        print_verbose(test_params, "Received no response!")
+    finally:
+        sock.close()
     return None
 
 
+# Functions used by sr1_file() to send test messages of given protocol
+SR1_FILE_HANDLERS = {
+    Protocol.CoAP: udp_sr1,
+    Protocol.DTLS: udp_sr1,
+    Protocol.mDNS: udp_sr1,
+    Protocol.MQTT: tcp_sr1,
+    Protocol.HTCPCP: tcp_sr1,
+    Protocol.RTSP: tcp_sr1,
+    Protocol.SSDP: ssdp_send_query,
+}
+
+
+def show_test_packet(test_params, protocol, test_packet):
+    """Displays test message parsed as request of given protocol."""
+    # every protocol with handler in SR1_FILE_HANDLERS has also request class,
+    # so only dissection of (possibly malformed) test message can fail here
+    request_class = proto_mapping_request(protocol)
+    try:
+        request_class(test_packet).show()
+    except (TypeError, struct.error, RuntimeError, ValueError, Scapy_Exception):
+        pass
+    else:
+        print_verbose(test_params, PACKET_SEPARATOR_LINE)
+
+
+def send_test_file(test_params, protocol, handler, test_filename, display_packet):
+    """Loads test message from file and sends it using given handler of protocol."""
+    if handler is None:
+        return None
+    test_packet = load_test_packet(test_filename)
+    if display_packet:
+        show_test_packet(test_params, protocol, test_packet)
+    return handler(test_params, test_packet)
+
+
+def make_sr1_file(protocol):
+    """Prepares function working like sr1_file() for messages of single protocol.
+
+        Handler of protocol is chosen once, so returned function can be used
+        for sending many test messages without repeating this choice.
+
+        Args:
+            protocol (Protocol): Protocol of test messages.
+
+        Returns:
+            function: Function taking the same arguments as sr1_file().
+    """
+    handler = SR1_FILE_HANDLERS.get(protocol)
+
+    def protocol_sr1_file(test_params, test_filename, display_packet=False):
+        """Sends test message of protocol chosen in make_sr1_file()."""
+        return send_test_file(
+            test_params, protocol, handler, test_filename, display_packet
+        )
+
+    return protocol_sr1_file
+
+
 def sr1_file(test_params, test_filename, display_packet=False):
     """Reads test message from given file, sends this message to server and parses response"""
-    with open(test_filename, "r") as file_handle:
-        test_packet = file_handle.read()
-    if display_packet:
-        # print("Protocol: {}".format(proto_mapping(test_params.protocol)))
-        try:
-            out_packet = proto_mapping_request(test_params.protocol)(test_packet)
-            out_packet.show()
-            print_verbose(test_params, 60 * "-")
-        except (TypeError, struct.error, RuntimeError, ValueError, Scapy_Exception):
-            pass
-    test_result = None
-    if test_params.protocol in [Protocol.CoAP, Protocol.DTLS, Protocol.mDNS]:
-        test_result = udp_sr1(test_params, test_packet)
-    if test_params.protocol in [Protocol.MQTT, Protocol.HTCPCP, Protocol.RTSP]:
-        test_result = tcp_sr1(test_params, test_packet)
-    if test_params.protocol in [Protocol.SSDP]:
-        test_result = ssdp_send_query(test_params, test_packet)
-    return test_result
+    return send_test_file(
+        test_params,
+        test_params.protocol,
+        SR1_FILE_HANDLERS.get(test_params.protocol),
+        test_filename,
+        display_packet,
+    )
 
 
 def prepare_names(name_filepath):
@@ -970,10 +1462,15 @@ def prepare_names(name_filepath):
     """
 
     try:
-        with open(name_filepath, "r") as file_handle:
-            names_list = {name.strip() for name in file_handle}
+        # whole file is taken in a single read, so buffering is not needed
+        with open(name_filepath, "rb", 0) as file_handle:
+            names_data = file_handle.read()
     except (IOError, OSError) as file_error:
         exit("Cannot load names: {}".format(file_error))
+    if not isinstance(names_data, str):
+        # whole content is decoded at once (only on Python 3, where str is not bytes)
+        names_data = names_data.decode("utf-8")
+    names_list = set(filter(None, map(str.strip, names_data.splitlines())))
     test_names = sorted(names_list)
     return test_names
 
@@ -989,6 +1486,6 @@ def amplification_factor(input_size, output_size):
             (0 means that traffic incoming and outgoing are equal in size,
             100 means that outgoing traffic is two times larger than incoming)
     """
-    if input_size != 0:
-        return (100 * output_size / input_size) - 100
+    if input_size:
+        return (100 * output_size // input_size) - 100
     return 0
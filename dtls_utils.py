@@ -80,6 +80,7 @@ from .common_utils import (
     udp_sr1,
     get_local_ip,
     get_random_high_port,
+    UINT16_STRUCT,
 )
 
 try:
@@ -181,7 +182,7 @@ class DTLSServerHello(PacketNoPayload):
             lambda pkt, s, val: True
             if val
             or pkt.extensions
-            or (s and struct.unpack("!H", s[:2])[0] == len(s) - 2)
+            or (s and UINT16_STRUCT.unpack_from(s)[0] == len(s) - 2)
             else False,
         ),
         TypedPacketListField(
@@ -488,25 +489,23 @@ def udp_send(test_params, data):
         in_data, server_addr = sock.recvfrom(INPUT_BUFFER_SIZE)
     except socket.timeout:
         print_verbose(test_params, "Timeout")
-        print_verbose(test_params, "Request size = {}".format(request_size))
+        print_verbose(test_params, "Request size = {}", request_size)
         return None
 
     response_size = len(in_data)
     print_verbose(
-        test_params, "Received packet size {} from {}".format(len(in_data), server_addr)
+        test_params, "Received packet size {} from {}", response_size, server_addr
     )
 
     try:
         response = DTLSRecord(in_data)
     except struct.error:
         print_verbose(test_params, "Parsing of DTLS message failed!")
-        print_verbose(test_params, "Request size = {}".format(request_size))
-        print_verbose(test_params, "Response size = {}".format(response_size))
+        print_verbose(test_params, "Request size = {}", request_size)
+        print_verbose(test_params, "Response size = {}", response_size)
         return in_data
 
-    print_verbose(
-        test_params, "Received packet DTLS type {}".format(response.content_type)
-    )
+    print_verbose(test_params, "Received packet DTLS type {}", response.content_type)
     show_verbose(test_params, response)
     return response
 
@@ -517,7 +516,7 @@ def scrap_response(test_params, packet):
         in_data = packet[Raw].load
         response = DTLSRecord(in_data)
         print_verbose(
-            test_params, "Received packet DTLS type {}".format(response.content_type)
+            test_params, "Received packet DTLS type {}", response.content_type
         )
         show_verbose(test_params, response)
         return response
@@ -541,6 +540,8 @@ def dtls_ping(test_params):
         response = udp_sr1(test_params, ping_data)
         if not response:
             continue
+        # ICMP errors are received only for spoofed source address (scapy sr1),
+        # otherwise udp_sr1() reports them as missing response
         if ICMP in response and response[ICMP].type == 3:
             print_verbose(test_params, "Received ICMP dest-unreachable")
             continue
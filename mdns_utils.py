@@ -130,7 +130,7 @@ def mdns_send_query(test_params, query, send_multicast=True):
     dns_sd_query = str(DNS(rd=1, qd=DNSQR(qname=query, qtype="PTR")))
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
     time.sleep(1)
-    udp_sr1(test_params, dns_sd_query)
+    udp_sr1(test_params, dns_sd_query, parse=False)
     if send_multicast:
         multicast_test_params = copy.deepcopy(test_params)
         if test_params.ip_version == 4:
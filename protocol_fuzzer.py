@@ -29,8 +29,10 @@ import time
 from scapy.all import Raw
 
 from .common_utils import (
+    PACKET_SEPARATOR_LINE,
     CotopaxiTester,
     print_verbose,
+    make_sr1_file,
     proto_mapping_response,
     sr1_file,
 )
@@ -48,10 +50,14 @@ class FuzzingCase(Vulnerability):
         """Verifies whether remote host is vulnerable to this vulnerability."""
         pass
 
-    def test_payload(self, test_params, test_timeouts, alive_before=True):
+    def test_payload(
+        self, test_params, test_timeouts, alive_before=True, send_payload=sr1_file
+    ):
         """
         Send payload for fuzzing.
         test_timeouts list is extended if applicable.
+        send_payload is function used to send payload (sr1_file or function
+        prepared by make_sr1_file).
         """
         if not alive_before:
             alive_before = service_ping(test_params)
@@ -76,26 +82,26 @@ class FuzzingCase(Vulnerability):
                 )
             )
             return False
-        print_verbose(test_params, 60 * "-" + "\nRequest:")
+        print_verbose(test_params, PACKET_SEPARATOR_LINE + "\nRequest:")
         payload_sent_time = time.time()
-        test_result = sr1_file(test_params, self.payload_file, test_params.verbose)
-        print_verbose(test_params, 60 * "-")
+        test_result = send_payload(test_params, self.payload_file, test_params.verbose)
+        print_verbose(test_params, PACKET_SEPARATOR_LINE)
         print ("[.] Payload {} sent".format(self.payload_file))
         if test_result is not None:
             test_timeouts.append(
                 (time.time() - payload_sent_time, self.payload_file, test_result)
             )
-            print (60 * "-" + "\nResponse:")
+            print (PACKET_SEPARATOR_LINE + "\nResponse:")
             try:
                 proto_handler = proto_mapping_response(test_params.protocol)
                 packet = proto_handler(test_result[Raw].load)
                 packet.show()
             except (TypeError, IndexError, struct.error):
                 pass
-            print (60 * "-")
+            print (PACKET_SEPARATOR_LINE)
         else:
             print ("Received no response from server")
-            print (60 * "-")
+            print (PACKET_SEPARATOR_LINE)
         alive_after = service_ping(test_params)
         if not alive_after and alive_before and not test_params.ignore_ping_check:
             print (
@@ -141,6 +147,7 @@ def perform_protocol_fuzzing(test_params, test_cases):
     """Checks service availability by sending 'ping' packet and waiting for response."""
     test_timeouts = []
     alive = False
+    send_payload = make_sr1_file(test_params.protocol)
     test_cases.sort(key=lambda x: x.payload_file)
     for num, fuzzing_case in enumerate(test_cases, start=1):
         print_verbose(
@@ -149,7 +156,9 @@ def perform_protocol_fuzzing(test_params, test_cases):
                 num, fuzzing_case.payload_file
             ),
         )
-        alive = fuzzing_case.test_payload(test_params, test_timeouts, alive)
+        alive = fuzzing_case.test_payload(
+            test_params, test_timeouts, alive, send_payload
+        )
         if not alive:
             return
 
@@ -20,22 +20,94 @@
 #    along with Cotopaxi.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import os
+import socket
+import struct
+import tempfile
+import threading
 import unittest
 import sys
 
 sys.path.append("..")
+from scapy.all import IP, UDP, Raw
 from .common_test_utils import scrap_output
 from ..common_utils import (
+    clear_local_ip_cache,
     get_local_ip,
     get_local_ipv6_address,
+    load_test_packet,
     prepare_ips,
+    prepare_names,
+    prepare_port_ranges,
     prepare_ports,
     parse_port,
     get_random_high_port,
+    tcp_sr1_batch,
+    udp_sr1,
+    udp_sr_batch,
+    TestParams,
 )
 from .common_runner import TimerTestRunner
 
 
+def start_tcp_server(reset=False):
+    """Starts local TCP server answering (or resetting) single connection."""
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_sock.bind(("127.0.0.1", 0))
+    server_sock.listen(1)
+
+    def serve():
+        client_sock, _ = server_sock.accept()
+        in_data = client_sock.recv(1024)
+        if reset:
+            # closing socket with zero linger time sends RST
+            client_sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+            )
+        else:
+            client_sock.send(b"Re: " + in_data)
+        client_sock.close()
+        server_sock.close()
+
+    server_thread = threading.Thread(target=serve)
+    server_thread.daemon = True
+    server_thread.start()
+    return server_sock.getsockname()[1]
+
+
+def start_udp_echo_server():
+    """Starts local UDP server answering single datagram."""
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_sock.bind(("127.0.0.1", 0))
+
+    def serve():
+        in_data, client_addr = server_sock.recvfrom(1024)
+        server_sock.sendto(b"Re: " + in_data, client_addr)
+        server_sock.close()
+
+    server_thread = threading.Thread(target=serve)
+    server_thread.daemon = True
+    server_thread.start()
+    return server_sock.getsockname()[1]
+
+
+def get_closed_port(sock_type):
+    """Returns local port without any listening socket."""
+    sock = socket.socket(socket.AF_INET, sock_type)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def local_test_params():
+    """Returns test parameters for tests using local servers."""
+    test_params = TestParams()
+    test_params.dst_endpoint.ip_addr = "127.0.0.1"
+    test_params.timeout_sec = 2
+    return test_params
+
+
 class TestCommonUtils(unittest.TestCase):
     def test_get_local_ip(self):
         local_ip = get_local_ip()
@@ -55,6 +127,12 @@ class TestCommonUtils(unittest.TestCase):
         # self.assertGreater(len(local_ip), 7)
         self.assertGreater(local_ip.count(":"), 0)
 
+    def test_clear_local_ip_cache(self):
+        local_ip = get_local_ip()
+        self.assertIs(get_local_ip(), local_ip)
+        clear_local_ip_cache()
+        self.assertEqual(get_local_ip(), local_ip)
+
     def test_get_random_high_port(self):
         port = get_random_high_port()
         print ("port: {}".format(port))
@@ -96,6 +174,103 @@ class TestCommonUtils(unittest.TestCase):
         expected = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
         self.assertListEqual(result, expected)
 
+        result = prepare_ports("20,5-8,1-6")
+        expected = [1, 2, 3, 4, 5, 6, 7, 8, 20]
+        self.assertListEqual(result, expected)
+
+    def test_prepare_port_ranges(self):
+        result = prepare_port_ranges("101,103-105,104,242")
+        expected = [(101, 101), (103, 105), (242, 242)]
+        self.assertListEqual(result, expected)
+
+        result = prepare_port_ranges("1-65535,80,443-8080")
+        expected = [(1, 65535)]
+        self.assertListEqual(result, expected)
+
+        result = prepare_port_ranges("10-12,1-3,4")
+        expected = [(1, 4), (10, 12)]
+        self.assertListEqual(result, expected)
+
+    def test_prepare_names(self):
+        result = prepare_names(
+            os.path.dirname(__file__) + "/../lists/urls/short_url_list.txt"
+        )
+        self.assertGreater(len(result), 0)
+        self.assertListEqual(result, sorted(set(result)))
+        self.assertNotIn("", result)
+        for name in result:
+            self.assertEqual(name, name.strip())
+
+        output = scrap_output(prepare_names, "/nonexistent/names.txt")
+        self.assertIn("Cannot load names", output)
+
+    def test_load_test_packet(self):
+        file_handle, file_path = tempfile.mkstemp()
+        os.write(file_handle, b"first")
+        os.close(file_handle)
+        try:
+            self.assertEqual(load_test_packet(file_path), "first")
+            with open(file_path, "w") as file_handle:
+                file_handle.write("second")
+            os.utime(file_path, (0, 0))
+            self.assertEqual(load_test_packet(file_path), "second")
+        finally:
+            os.remove(file_path)
+
+    def test_tcp_sr1_batch(self):
+        test_params = local_test_params()
+        responding_port = start_tcp_server()
+        resetting_port = start_tcp_server(reset=True)
+        closed_port = get_closed_port(socket.SOCK_STREAM)
+        result = tcp_sr1_batch(
+            test_params, "ping", [responding_port, resetting_port, closed_port]
+        )
+        self.assertDictEqual(result, {responding_port: b"Re: ping"})
+        self.assertEqual(test_params.test_stats.packets_sent, 3)
+        self.assertEqual(test_params.test_stats.packets_received, 1)
+
+    def test_udp_sr1(self):
+        test_params = local_test_params()
+        test_params.dst_endpoint.port = start_udp_echo_server()
+        result = udp_sr1(test_params, b"ping", parse=False)
+        self.assertEqual(result, b"Re: ping")
+
+        test_params.dst_endpoint.port = start_udp_echo_server()
+        result = udp_sr1(test_params, b"ping")
+        self.assertEqual(result[Raw].load, b"Re: ping")
+        self.assertEqual(result[IP].src, "127.0.0.1")
+        self.assertEqual(result[UDP].sport, test_params.dst_endpoint.port)
+        self.assertEqual(result[UDP].dport, test_params.src_endpoint.port)
+
+        test_params.dst_endpoint.port = get_closed_port(socket.SOCK_DGRAM)
+        result = udp_sr1(test_params, b"ping")
+        self.assertIsNone(result)
+        self.assertEqual(test_params.test_stats.packets_sent, 3)
+        self.assertEqual(test_params.test_stats.packets_received, 2)
+
+    def test_udp_sr_batch(self):
+        test_params = local_test_params()
+        # closed port does not respond, so whole timeout is awaited
+        test_params.timeout_sec = 0.5
+        first_port = start_udp_echo_server()
+        second_port = start_udp_echo_server()
+        closed_port = get_closed_port(socket.SOCK_DGRAM)
+        dst_list = [
+            ("127.0.0.1", first_port),
+            ("127.0.0.1", closed_port),
+            # sending to broadcast address fails without SO_BROADCAST option
+            ("255.255.255.255", 9),
+            ("127.0.0.1", second_port),
+        ]
+        result = udp_sr_batch(test_params, b"ping", dst_list)
+        expected = {
+            ("127.0.0.1", first_port): b"Re: ping",
+            ("127.0.0.1", second_port): b"Re: ping",
+        }
+        self.assertDictEqual(result, expected)
+        self.assertEqual(test_params.test_stats.packets_sent, 3)
+        self.assertEqual(test_params.test_stats.packets_received, 2)
+
     def test_parse_port(self):
         output = scrap_output(parse_port, "101,103-105,104,242")
         # expected = None
@@ -154,17 +154,18 @@ def udp_sr(test_params, data, response_count=99999, protocol=CoAP):
             in_data, server_addr = sock.recvfrom(INPUT_BUFFER_SIZE)
             response_size += len(in_data)
             response.append(in_data)
-            packet = protocol(in_data)
-            print_verbose(
-                test_params,
-                "Received packet size {} from {}\n{}".format(
-                    len(in_data), server_addr, show_verbose(test_params, packet)
-                ),
-            )
+            if test_params.verbose:
+                packet = protocol(in_data)
+                print_verbose(
+                    test_params,
+                    "Received packet size {} from {}\n{}".format(
+                        len(in_data), server_addr, show_verbose(test_params, packet)
+                    ),
+                )
     except socket.timeout:
         print_verbose(test_params, "Timeout")
-    print_verbose(test_params, "Request size = {}".format(request_size))
-    print_verbose(test_params, "Response size = {}".format(response_size))
+    print_verbose(test_params, "Request size = {}", request_size)
+    print_verbose(test_params, "Response size = {}", response_size)
     return response
 
 